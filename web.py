@@ -1,94 +1,181 @@
-from bs4 import BeautifulSoup
-import requests
+from selectolax.lexbor import LexborHTMLParser
+import aiohttp
+import asyncio
+import atexit
+import hashlib
 import json
+import logging
+import orjson
 import os
+import queue
 import re
-import concurrent.futures
+import sys
 import time
-from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 
 # Constants
 ADMIN_URL = "https://web.animerco.org/wp-admin/admin-ajax.php"
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
 IMG_BB_API_KEY = "540a4171008b7d59dbc4cc88e8a8ce4b"
-MAX_WORKERS = 10  # Limit concurrent requests to avoid rate limiting
+MAX_WORKERS = 10  # Per-host connection cap to avoid rate limiting
+SCRAPE_WORKERS = 4  # Anime scraped at once in __main__
 LINKS_FILE = "all_anime_links.json"
+# 3.05s connect avoids aliasing with TCP retransmit; reads keep the old budget
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(sock_connect=3.05, sock_read=10)
+UPLOAD_TIMEOUT = aiohttp.ClientTimeout(sock_connect=3.05, sock_read=15)
+EPISODE_TIMEOUT = 60  # Hard cap per episode so one stuck host can't stall an anime
+CACHE_TTL = 86400  # 24 hours in seconds
+
+# Workers enqueue log records; a single listener thread drains them to
+# stdout so the episode fan-out never contends on the stream lock
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(_log_queue, logging.StreamHandler(sys.stdout))
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+logger = logging.getLogger(__name__)
+logger.addHandler(QueueHandler(_log_queue))
+logger.setLevel(logging.INFO)
+
+# Static part of the admin-ajax headers; only the Referer varies per episode
+_EMBED_HEADERS = {
+    "accept": "*/*",
+    "accept-language": "en,en-GB;q=0.9,en-US;q=0.8",
+    "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
+    "priority": "u=1, i",
+    "sec-ch-ua": '"Chromium";v="134", "Not:A-Brand";v="24", "Microsoft Edge";v="134"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"Windows"',
+    "sec-fetch-dest": "empty",
+    "sec-fetch-mode": "cors",
+    "sec-fetch-site": "same-origin",
+    "x-requested-with": "XMLHttpRequest",
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+}
+
+# Precompiled regexes for the hot paths
+_EP_NUM_RE = re.compile(r'-(\d+)(?:-|$)')
+_SANITIZE_RE = re.compile(r"[^\w\-]")
+_ANIME_NAME_RE = re.compile(r"https://web\.animerco\.org/seasons/([^/]+)/")
+
+
+def _load_ttl_cache(path):
+    """Load a {key: [timestamp, value]} cache file, dropping expired entries."""
+    try:
+        with open(path, "rb") as f:
+            raw = orjson.loads(f.read())
+        now = time.time()
+        return {k: v for k, v in raw.items() if now - v[0] < CACHE_TTL}
+    except (OSError, ValueError):
+        return {}
 
-# Create a session object to reuse for all requests
-session = requests.Session()
-session.headers.update({"User-Agent": USER_AGENT})
 
+def _flush_ttl_cache(path, cache):
+    """Atomically write a TTL cache back to disk on interpreter exit."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(cache))
+    os.replace(tmp, path)
 
-@lru_cache(maxsize=128)
-def get_postid(url):
-    """Extract the postid from a given episode page with caching"""
-    try:
-        response = session.get(url, timeout=10)
-        response.raise_for_status()
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        postid_input = soup.find("input", {"type": "hidden", "name": "postid"})
+# Persistent TTL caches so repeat runs skip the postid/embed/upload round-trips
+POSTID_CACHE_FILE = "cache/_postids.json"
+EMBED_CACHE_FILE = "cache/_embeds.json"
+IMGBB_CACHE_FILE = "cache/_imgbb.json"
+
+# Pay the cache-directory stat once at import, not per anime
+os.makedirs("cache", exist_ok=True)
+
+_postid_cache = _load_ttl_cache(POSTID_CACHE_FILE)
+_embed_cache = _load_ttl_cache(EMBED_CACHE_FILE)
+_imgbb_cache = _load_ttl_cache(IMGBB_CACHE_FILE)
+
+atexit.register(_flush_ttl_cache, POSTID_CACHE_FILE, _postid_cache)
+atexit.register(_flush_ttl_cache, EMBED_CACHE_FILE, _embed_cache)
+atexit.register(_flush_ttl_cache, IMGBB_CACHE_FILE, _imgbb_cache)
 
-        return postid_input["value"] if postid_input else None
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to retrieve page {url}, error: {e}")
+# Gate shared by every anime's episode fan-out so at most MAX_WORKERS embed
+# requests are in flight process-wide, matching the connector's per-host cap
+_episode_gate = asyncio.Semaphore(MAX_WORKERS)
+
+
+async def get_postid(session, url):
+    """Extract the postid from a given episode page with caching"""
+    cached = _postid_cache.get(url)
+    if cached and time.time() - cached[0] < CACHE_TTL:
+        return cached[1]
+
+    try:
+        async with session.get(url, timeout=REQUEST_TIMEOUT) as response:
+            response.raise_for_status()
+            content = await response.read()
+
+        tree = LexborHTMLParser(content)
+        postid_input = tree.css_first('input[name="postid"][type="hidden"]')
+
+        postid = postid_input.attributes.get("value") if postid_input else None
+        if postid:
+            _postid_cache[url] = (time.time(), postid)
+        return postid
+    except aiohttp.ClientError as e:
+        logger.warning("Failed to retrieve page %s, error: %s", url, e)
         return None
 
 
-def get_episode_embed(episode_url):
+async def get_episode_embed(session, episode_url, postid_value=None):
     """Get the embed URL for a specific episode"""
-    postid_value = get_postid(episode_url)
+    cached = _embed_cache.get(episode_url)
+    if cached and time.time() - cached[0] < CACHE_TTL:
+        return cached[1]
 
     if not postid_value:
-        print(f"Could not find postid for {episode_url}")
-        return None
+        postid_value = await get_postid(session, episode_url)
 
-    headers = {
-        "accept": "*/*",
-        "accept-language": "en,en-GB;q=0.9,en-US;q=0.8",
-        "content-type": "application/x-www-form-urlencoded; charset=UTF-8",
-        "priority": "u=1, i",
-        "sec-ch-ua": '"Chromium";v="134", "Not:A-Brand";v="24", "Microsoft Edge";v="134"',
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": '"Windows"',
-        "sec-fetch-dest": "empty",
-        "sec-fetch-mode": "cors",
-        "sec-fetch-site": "same-origin",
-        "x-requested-with": "XMLHttpRequest",
-        "Referer": episode_url,
-        "Referrer-Policy": "strict-origin-when-cross-origin",
-    }
+    if not postid_value:
+        logger.warning("Could not find postid for %s", episode_url)
+        return None
 
+    headers = {**_EMBED_HEADERS, "Referer": episode_url}
     payload = f"action=player_ajax&post={postid_value}&nume=1&type=tv"
 
     try:
-        response = session.post(ADMIN_URL, headers=headers, data=payload, timeout=10)
-        response.raise_for_status()
-        return response.text
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to get embed for {episode_url}, error: {e}")
+        async with session.post(ADMIN_URL, headers=headers, data=payload, timeout=REQUEST_TIMEOUT) as response:
+            response.raise_for_status()
+            embed_info = await response.read()
+
+        # admin-ajax reports failures as HTTP 200 with "0" or an error body;
+        # only cache payloads that actually carry an embed_url so a transient
+        # failure can't stick for the full TTL (decoded form: JSON on disk)
+        try:
+            if orjson.loads(embed_info).get("embed_url"):
+                _embed_cache[episode_url] = (time.time(), embed_info.decode())
+        except orjson.JSONDecodeError:
+            pass
+        return embed_info
+    except aiohttp.ClientError as e:
+        logger.warning("Failed to get embed for %s, error: %s", episode_url, e)
         return None
 
 
 def extract_episode_number(url):
     """Extract episode number from URL using regex for better performance"""
-    match = re.search(r'-(\d+)(?:-|$)', url)
+    match = _EP_NUM_RE.search(url)
     return int(match.group(1)) if match else None
 
 
-def process_episode_link(link, index):
+async def process_episode_link(session, link, postid, index):
     """Process a single episode link and return its info"""
     # Try to extract episode number from URL or use the index
     ep_num = extract_episode_number(link) or index
 
-    embed_info = get_episode_embed(link)
+    embed_info = await get_episode_embed(session, link, postid)
 
     if not embed_info:
         return None
 
     try:
-        # Parse the JSON response
-        embed_data = json.loads(embed_info)
+        # Parse the JSON response straight from bytes
+        embed_data = orjson.loads(embed_info)
         embed_url = embed_data.get("embed_url")
 
         if embed_url:
@@ -98,134 +185,131 @@ def process_episode_link(link, index):
                 "embed_url": embed_url,
                 "type": embed_data.get("type"),
             }
-            print(f"Found embed URL for episode {ep_num}: {embed_url}")
+            logger.info("Found embed URL for episode %s: %s", ep_num, embed_url)
             return str(ep_num), result
-    except json.JSONDecodeError:
-        print(f"Failed to parse JSON for episode {ep_num}")
+    except orjson.JSONDecodeError:
+        logger.warning("Failed to parse JSON for episode %s", ep_num)
 
     return None
 
 
-def get_all_episodes(base_url):
-    """Get all episode links and their embed URLs using parallel processing"""
-    try:
-        response = session.get(base_url, timeout=10)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, "html.parser")
-        # Find all episode links - optimize selector for speed
-        episodes_list = soup.select(".episodes-lists a[href]")
-
-        # Remove duplicate URLs more efficiently
-        unique_links = []
-        seen_urls = set()
-
-        for a_tag in episodes_list:
-            link = a_tag["href"]
-            if link not in seen_urls:
-                unique_links.append(link)
-                seen_urls.add(link)
-
-        print(f"Found {len(episodes_list)} total links, {len(unique_links)} unique links for {base_url}")
-
-        # Process links in parallel
-        embed_results = {}
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_to_link = {
-                executor.submit(process_episode_link, link, i + 1): link
-                for i, link in enumerate(unique_links)
-            }
-
-            for future in concurrent.futures.as_completed(future_to_link):
-                link = future_to_link[future]
-                try:
-                    result = future.result()
-                    if result:
-                        ep_num, data = result
-                        embed_results[ep_num] = data
-                except Exception as e:
-                    print(f"Error processing {link}: {e}")
-
-        return embed_results
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to retrieve main page {base_url}, error: {e}")
-        return None
-
-
-def upload_image_from_url(image_url):
+def get_episode_links(tree, base_url):
+    """Collect unique episode links (and any embedded postids) from a parsed page"""
+    # Find all episode links - optimize selector for speed
+    episodes_list = tree.css(".episodes-lists a[href]")
+
+    # Dedupe URLs in one pass: dicts preserve insertion order, and the value
+    # keeps any postid the listing page already embeds so we can skip the
+    # per-episode GET. Duplicate anchors (thumbnail + title) for the same
+    # href don't all carry the id, so never overwrite a found postid
+    unique_links = {}
+    for a_tag in episodes_list:
+        attrs = a_tag.attributes
+        link = attrs["href"]
+        if unique_links.get(link) is None:
+            unique_links[link] = attrs.get("data-post") or attrs.get("data-id")
+
+    logger.info("Found %d total links, %d unique links for %s", len(episodes_list), len(unique_links), base_url)
+    return unique_links
+
+
+async def get_all_episodes(session, tree, base_url):
+    """Get all episode links and their embed URLs using concurrent requests"""
+    unique_links = get_episode_links(tree, base_url)
+
+    async def process_bounded(link, postid, index):
+        # Queue for a slot before starting the per-episode clock, so time
+        # spent waiting behind other episodes (or other anime) doesn't
+        # count against EPISODE_TIMEOUT
+        async with _episode_gate:
+            return await asyncio.wait_for(
+                process_episode_link(session, link, postid, index), EPISODE_TIMEOUT
+            )
+
+    # Process links concurrently; the shared gate bounds fan-out and the
+    # per-episode cap keeps one stuck host from stalling the gather
+    results = await asyncio.gather(
+        *[
+            process_bounded(link, postid, i + 1)
+            for i, (link, postid) in enumerate(unique_links.items())
+        ],
+        return_exceptions=True,
+    )
+
+    embed_results = {}
+    for link, result in zip(unique_links, results):
+        if isinstance(result, Exception):
+            logger.warning("Error processing %s: %s", link, result)
+        elif result:
+            ep_num, data = result
+            embed_results[ep_num] = data
+
+    return embed_results
+
+
+async def upload_image_from_url(session, image_url):
     """Downloads an image from a URL and uploads it to ImgBB."""
     if not image_url:
         return None
 
+    # Skip the upload if this source URL was already hosted recently
+    cache_key = hashlib.sha1(image_url.encode()).hexdigest()
+    cached = _imgbb_cache.get(cache_key)
+    if cached and time.time() - cached[0] < CACHE_TTL:
+        return cached[1]
+
     url = "https://api.imgbb.com/1/upload"
     payload = {"key": IMG_BB_API_KEY, "image": image_url}
 
     try:
-        response = session.post(url, data=payload, timeout=15)
-        response.raise_for_status()
+        async with session.post(url, data=payload, timeout=UPLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            data = orjson.loads(await response.read())
 
-        data = response.json()
         if data["success"]:
-            return data["data"]["url"]
+            hosted_url = data["data"]["url"]
+            _imgbb_cache[cache_key] = (time.time(), hosted_url)
+            return hosted_url
         else:
-            print("ImgBB upload failed:", data)
+            logger.warning("ImgBB upload failed: %s", data)
             return None
     except Exception as e:
-        print(f"ImgBB upload error: {e}")
+        logger.warning("ImgBB upload error: %s", e)
         return None
 
 
-def get_bg_image(base_url):
-    """Get background image URL with improved selector"""
-    try:
-        response = session.get(base_url, timeout=10)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Directly find the element with a more specific selector
-        a_tag = soup.select_one("div.anime-card.player a.image")
-
-        if a_tag and a_tag.has_attr("data-src"):
-            bg_image_url = a_tag["data-src"]
-            return upload_image_from_url(bg_image_url)
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to get background image for {base_url}, error: {e}")
-        return None
+async def get_bg_image(session, tree):
+    """Get background image URL from a pre-parsed page"""
+    # Directly find the element with a more specific selector
+    a_tag = tree.css_first("div.anime-card.player a.image")
 
+    if a_tag:
+        bg_image_url = a_tag.attributes.get("data-src")
+        if bg_image_url:
+            return await upload_image_from_url(session, bg_image_url)
+    return None
 
-def extract_info(base_url):
-    """Extract anime info with improved error handling"""
-    try:
-        response = session.get(base_url, timeout=10)
-        response.raise_for_status()
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        media_box = soup.find("div", class_="media-box")
+def extract_info(tree):
+    """Extract anime info from a pre-parsed page"""
+    media_box = tree.css_first("div.media-box")
 
-        if not media_box:
-            return {"error": "media-box not found"}
+    if not media_box:
+        return {"error": "media-box not found"}
 
-        # Extract genres more efficiently
-        genre_list = []
-        genres = media_box.find("div", class_="genres")
-        if genres:
-            genre_list = [{"text": a.text.strip()} for a in genres.find_all("a")]
+    # Extract genres more efficiently
+    genre_list = [{"text": a.text().strip()} for a in media_box.css(".genres a")]
 
-        # Extract content
-        content_div = media_box.find("div", class_="content")
-        content_text = content_div.find("p").text.strip() if content_div and content_div.find("p") else None
+    # Extract content
+    content_p = media_box.css_first(".content p")
+    content_text = content_p.text().strip() if content_p else None
 
-        return {"genres": genre_list, "content": content_text}
-    except requests.exceptions.RequestException as e:
-        return {"error": f"Request failed: {e}"}
+    return {"genres": genre_list, "content": content_text}
 
 
 def get_anime_name_from_url(base_url):
     """Extracts the anime name from the base URL with compiled regex for speed."""
-    pattern = re.compile(r"https://web\.animerco\.org/seasons/([^/]+)/")
-    match = pattern.search(base_url)
+    match = _ANIME_NAME_RE.search(base_url)
     return match.group(1) if match else "unknown_anime"
 
 
@@ -234,10 +318,43 @@ def sanitize_filename(filename):
     # Replace spaces with underscores
     filename = filename.replace(" ", "_")
     # Remove any characters that are not alphanumeric, underscores, or hyphens
-    return re.sub(r"[^\w\-]", "", filename)
+    return _SANITIZE_RE.sub("", filename)
+
+
+def _make_session():
+    """Build the shared session; the single connector's limits bound the
+    aggregate connections the whole run opens to the server."""
+    connector = aiohttp.TCPConnector(limit=32, limit_per_host=MAX_WORKERS, keepalive_timeout=85)
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers={
+            "User-Agent": USER_AGENT,
+            "Connection": "keep-alive",
+            "Accept-Encoding": "gzip, deflate, br",
+        },
+    )
+
+
+async def _scrape(session, base_url):
+    """Fetch and parse the base page once, then run the scrape tasks."""
+    try:
+        async with session.get(base_url, timeout=REQUEST_TIMEOUT) as response:
+            response.raise_for_status()
+            content = await response.read()
+    except aiohttp.ClientError as e:
+        logger.error("Failed to retrieve main page %s, error: %s", base_url, e)
+        return None, None, {"error": f"Request failed: {e}"}
+
+    tree = LexborHTMLParser(content)
+
+    episodes, img_url = await asyncio.gather(
+        get_all_episodes(session, tree, base_url),
+        get_bg_image(session, tree),
+    )
+    return episodes, img_url, extract_info(tree)
 
 
-def scrape_and_save(base_url):
+async def scrape_and_save(session, base_url):
     """
     Scrapes episode data from the given URL concurrently, including background image and
     anime info, and saves it to a JSON file named after the anime name.
@@ -246,40 +363,32 @@ def scrape_and_save(base_url):
 
     # Validate URL
     if not base_url.startswith("https://web.animerco.org/"):
-        print(f"Error: Invalid URL - {base_url}. Only URLs from web.animerco.org are supported")
-        return
-
-    # Create cache directory if it doesn't exist
-    os.makedirs("cache", exist_ok=True)
+        logger.error("Error: Invalid URL - %s. Only URLs from web.animerco.org are supported", base_url)
+        return None
 
     # Generate filename from URL
     anime_name = get_anime_name_from_url(base_url)
     safe_anime_name = sanitize_filename(anime_name)
     cache_file = f"cache/{safe_anime_name}.json"
 
-    # Check if cache file exists and is recent (less than 1 day old)
-    if os.path.exists(cache_file):
-        file_age = time.time() - os.path.getmtime(cache_file)
-        if file_age < 86400:  # 24 hours in seconds
-            print(f"Using cached data from {cache_file} (age: {file_age/3600:.1f} hours)")
-            return
-
-    print(f"Scraping data for: {base_url}")
+    # Return cached data if the file is recent (one stat covers both checks);
+    # a missing or corrupt file just falls through to a re-scrape
+    try:
+        file_age = time.time() - os.stat(cache_file).st_mtime
+        if file_age < CACHE_TTL:
+            logger.info("Using cached data from %s (age: %.1f hours)", cache_file, file_age / 3600)
+            with open(cache_file, "rb") as f:
+                return orjson.loads(f.read())
+    except (OSError, ValueError):
+        pass
 
-    # Run tasks concurrently
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        episodes_future = executor.submit(get_all_episodes, base_url)
-        img_url_future = executor.submit(get_bg_image, base_url)
-        info_future = executor.submit(extract_info, base_url)
+    logger.info("Scraping data for: %s", base_url)
 
-        # Get results
-        episodes = episodes_future.result()
-        img_url = img_url_future.result()
-        info = info_future.result()
+    episodes, img_url, info = await _scrape(session, base_url)
 
     if episodes is None:
-        print(f"Error: Failed to fetch episodes for {base_url}")
-        return
+        logger.error("Error: Failed to fetch episodes for %s", base_url)
+        return None
 
     # Prepare data for saving
     data_to_save = {
@@ -290,18 +399,34 @@ def scrape_and_save(base_url):
         "episodes": episodes,
     }
 
-    # Save to cache
-    with open(cache_file, "w") as f:
-        json.dump(data_to_save, f, indent=2)
+    # Save to cache atomically so a crash mid-write can't corrupt it
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(orjson.dumps(data_to_save, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_file, cache_file)
 
     elapsed_time = time.time() - start_time
-    print(f"Successfully scraped and saved data for {base_url} to {cache_file}")
-    print(f"Process completed in {elapsed_time:.2f} seconds")
+    logger.info("Successfully scraped and saved data for %s to %s", base_url, cache_file)
+    logger.info("Process completed in %.2f seconds", elapsed_time)
+    return data_to_save
+
+
+async def _main(anime_links):
+    """Scrape all anime over one event loop and session, at most
+    SCRAPE_WORKERS at a time."""
+    async with _make_session() as session:
+        semaphore = asyncio.Semaphore(SCRAPE_WORKERS)
+
+        async def scrape_bounded(url):
+            async with semaphore:
+                return await scrape_and_save(session, url.strip())
+
+        await asyncio.gather(*(scrape_bounded(url) for url in anime_links))
 
 
 if __name__ == "__main__":
     if not os.path.exists(LINKS_FILE):
-        print(f"Error: The file '{LINKS_FILE}' was not found.")
+        logger.error("Error: The file '%s' was not found.", LINKS_FILE)
     else:
         try:
             with open(LINKS_FILE, "r") as f:
@@ -309,13 +434,11 @@ if __name__ == "__main__":
                 anime_links = data.get("anime_links", [])
 
             if not anime_links:
-                print(f"No anime links found in '{LINKS_FILE}'.")
+                logger.info("No anime links found in '%s'.", LINKS_FILE)
             else:
-                for base_url in anime_links:
-                    scrape_and_save(base_url.strip())
-                    time.sleep(1) # Be respectful to the server
+                asyncio.run(_main(anime_links))
 
         except json.JSONDecodeError:
-            print(f"Error: Failed to decode JSON from '{LINKS_FILE}'. Please ensure it's a valid JSON file.")
+            logger.error("Error: Failed to decode JSON from '%s'. Please ensure it's a valid JSON file.", LINKS_FILE)
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            logger.error("An unexpected error occurred: %s", e)